@@ -97,7 +97,7 @@ class PermSystem:
                 if self.check_perm(p, user_id, group_id):
                     return True
             return False
-        logger.debug(f"Checking permission {perm_name} for user {user_id} in group {group_id}")
+        logger.debug("Checking permission %s for user %s in group %s", perm_name, user_id, group_id)
         if perm_name not in self.registered_perms:
             logger.warning(f"[yellow]Permission {perm_name} not registered, ingoring it.[/]")
             return True
@@ -45,7 +45,7 @@ class PluginManager:
 
         requirements_file = os.path.join(plugin_path,'requirements.txt')
         if os.path.exists(requirements_file):
-            if not os.path.exists(requirements_file + ".coral_installed") and not await self.register.execute_function("check_pip_requirements", requirements_file):
+            if not await self.register.execute_function("check_pip_requirements", requirements_file):
                 logger.warning("[yellow]Plugin [/]" + str(plugin_name) + "[yellow] has unmet requirements, trying to install them...[/]")
                 if not await self.register.execute_function("install_pip_requirements", requirements_file):
                     logger.error("[red]Failed to install requirements for plugin [/]" + str(plugin_name) + "[red] , skipping...[/]")
@@ -67,7 +67,7 @@ class Register:
                 except Exception as e:
                     logger.exception(f"[red]Error executing command {command_name}: {e}[/]")
                     raise e
-            logger.debug(f"Executing command {command_name} with data {data}")
+            logger.debug("Executing command %s with data %s", command_name, data)
             try:
                 return self.commands[command_name](data)
             except Exception as e:
@@ -89,7 +89,7 @@ class Register:
         ori_args = args
         args_changed = False
         for event_name, func, priority in self.event_queues[event]:
-            logger.debug(f"Executing event {event_name} with args {args}")
+            logger.debug("Executing event %s with args %s", event_name, args)
             try:
                 result = await func(*args)
             except Exception as e:
@@ -98,7 +98,7 @@ class Register:
             if result is not None:
                 if isinstance(result, tuple) and len(result) == 4:
                     result_args, change_args, interrupt, new_priority = result
-                    logger.debug(f"Event {event_name} returns {result_args}, change args to {change_args}, interrupt: {interrupt}, new priority: {new_priority}")
+                    logger.debug("Event %s returns %s, change args to %s, interrupt: %s, new priority: %s", event_name, result_args, change_args, interrupt, new_priority)
                     if change_args:
                         args = (result_args,)
                         args_changed = True
@@ -1,11 +1,12 @@
 import os
 import sys
-import subprocess
 import logging
 import shutil
 import datetime
+from importlib.metadata import distributions
 from rich.logging import RichHandler
 from rich.traceback import install
+from utils.install_requirements import normalize_name, requirement_name
 
 if not os.path.exists('logs'):
     os.makedirs('logs')
@@ -21,12 +22,11 @@ if not os.path.exists('config.json'):
     logging.info("Checking requirements, this may take a while...")
     with open('./requirements.txt', 'r') as f:
         lines = f.readlines()
+    installed = {normalize_name(d.metadata["Name"]) for d in distributions() if d.metadata["Name"]}
     for line in lines:
         if line.startswith('#') or line.strip() == '':
             continue
-        try:
-            subprocess.check_call([sys.executable, '-m', 'pip', 'show', line.strip()], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except subprocess.CalledProcessError as e:
+        if normalize_name(requirement_name(line)) not in installed:
             logging.critical("[[bold red blink]]Failed to check requirement: {}[/]".format(line.strip()))
             logging.error("Did you install it?\U0001F605")
             sys.exit(1)
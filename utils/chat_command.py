@@ -23,7 +23,7 @@ class ChatCommand:
         if not raw_message.startswith('!'):
             return {"message": None, "sender_user_id": sender_user_id, "group_id": group_id}, False, False, 1
 
-        logger.info(f"Received command: {raw_message}")
+        logger.info("Received command: %s", raw_message)
         if not self.perm_system.check_perm(["chat_command", "chat_command.execute"], sender_user_id, group_id):
             return {"message": None, "sender_user_id": sender_user_id, "group_id": group_id}, False, False, 1
         parts = raw_message.split(' ', 1)
@@ -39,7 +39,7 @@ class ChatCommand:
 
         try:
             send_message = self.register.execute_command(command, sender_user_id, group_id, args)
-            logger.debug(f"Command {command} executed with args {args} and returned {send_message}")
+            logger.debug("Command %s executed with args %s and returned %s", command, args, send_message)
         except Exception as e:
             return {"message": f"Error: {e}", "sender_user_id": sender_user_id, "group_id": group_id}, True, False, 1
 
@@ -2,6 +2,11 @@ import os
 import json
 import logging
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 main_config_template = {
@@ -10,12 +15,25 @@ main_config_template = {
 }
 
 
+def _loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=4).encode()
+
+
 class Config:
     main_config = "./config.json"
 
     def __init__(self, main_config):
         self.main_config = main_config
         self.config = {}
+        self._saved = {}
+        self.version = 0
         self.load_config(self.main_config)
 
     def load_config(self, config):
@@ -24,13 +42,14 @@ class Config:
             self.config = main_config_template
         else:
             try:
-                with open(config, "r") as f:
-                    self.config = json.load(f)
+                with open(config, "rb") as f:
+                    self.config = _loads(f.read())
             except Exception as e:
                 logger.exception(f"[red]Error loading config file: {e}[/]")
                 logger.warning("[yellow]Backing up and creating a default one.[/]")
                 os.rename(config, config + ".bak")
                 self.config = main_config_template
+        self.version += 1
 
     def get(self, key, default=None):
         value = self.config.get(key, default)
@@ -39,11 +58,21 @@ class Config:
         return value
 
     def set(self, key, value):
+        # 配置项变化时递增版本号，供调用方判断缓存是否失效。
+        # 仅能感知重新赋值：dict/list 原地修改后再 set 同一对象不会递增，
+        # 依赖版本号的缓存只应用于标量配置项
+        if key not in self.config or self.config[key] != value:
+            self.version += 1
         self.config[key] = value
         self.save()
 
     def save(self, config=None):
         if not config:
             config = self.main_config
-        with open(config, "w") as f:
-            json.dump(self.config, f, indent=4)
\ No newline at end of file
+        text = _dumps(self.config)
+        # 内容与上次写入一致时跳过写盘
+        if self._saved.get(config) == text:
+            return
+        with open(config, "wb") as f:
+            f.write(text)
+        self._saved[config] = text
\ No newline at end of file
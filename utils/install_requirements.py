@@ -3,13 +3,24 @@ import subprocess
 import sys
 import logging
 import re
+import hashlib
+import asyncio
+from importlib.metadata import distributions
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeRemainingColumn
 
 logger = logging.getLogger(__name__)
 
 def register_plugin(register, config, perm_system):
-    register.register_function('install_pip_requirements', InstallRequirements(config).install_pip_requirements)
-    register.register_function('check_pip_requirements', InstallRequirements(config).check_pip_requirements)
+    install_requirements = InstallRequirements(config)
+    register.register_function('install_pip_requirements', install_requirements.install_pip_requirements)
+    register.register_function('check_pip_requirements', install_requirements.check_pip_requirements)
+
+def normalize_name(name):
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def requirement_name(line):
+    # 解析包名
+    return re.split('>=|>|<=|<|==|!=|~=|;|\\[', line.strip())[0].strip()
 
 class InstallRequirements:
     config = None
@@ -24,55 +35,82 @@ class InstallRequirements:
             TimeRemainingColumn(),
             transient=True,
         )
-        
+        self.progress_users = 0
+        self.install_lock = asyncio.Lock()
+
+    def start_progress(self):
+        # 多个安装任务共用同一个进度显示，仅在首个任务开始时启动
+        if self.progress_users == 0:
+            self.progress.start()
+        self.progress_users += 1
+
+    def stop_progress(self, task):
+        self.progress.remove_task(task)
+        self.progress_users -= 1
+        if self.progress_users == 0:
+            self.progress.stop()
+
     async def install_pip_requirements(self, requirements_file):
         if not os.path.exists(requirements_file):
             logger.error("[red]Requirements file not found: {}[/]".format(requirements_file))
             return False
-        task = self.progress.add_task("[green]Installing plugin requirements...", total=None)
-        with self.progress:
+        with open(requirements_file, 'r') as f:
+            total = sum(1 for line in f if line.strip() and not line.startswith('#'))
+        task = self.progress.add_task("[green]Installing plugin requirements...", total=total)
+        self.start_progress()
+        try:
             index_url = self.config.get('index_url', 'https://pypi.tuna.tsinghua.edu.cn/simple')
-            try:
-                subprocess.check_call([sys.executable, '-m', 'pip', 'install', '-i', index_url, '-r', requirements_file], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            except subprocess.CalledProcessError as e:
-                logger.error("[red]Failed to install requirements: {}[/]".format(e))
-                self.progress.stop()
+            # pip 安装耗时较长，放到工作线程中执行以免阻塞事件循环；
+            # 插件并发加载时多个 pip 不能同时写入同一环境，需逐个安装
+            async with self.install_lock:
+                returncode = await asyncio.to_thread(self.run_pip_install, [sys.executable, '-m', 'pip', 'install', '-i', index_url, '-r', requirements_file], task, total)
+            if returncode != 0:
+                logger.error("[red]Failed to install requirements: pip exited with code {}[/]".format(returncode))
                 return False
-            self.progress.update(task)
-            self.progress.stop()
             return True
+        finally:
+            # 出错或被取消时也要释放进度显示
+            self.stop_progress(task)
+
+    def run_pip_install(self, command, task, total):
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors='replace', bufsize=1)
+        collected = 0
+        for line in process.stdout:
+            logger.debug(line.rstrip())
+            # 根据 pip 输出的 Collecting 行推进进度，间接依赖也会计入，因此以 total 为上限
+            if line.startswith('Collecting '):
+                collected += 1
+                self.progress.update(task, completed=min(collected, total), description="[green]Installing {}...".format(line.split()[1]))
+        return process.wait()
     
     async def check_pip_requirements(self, requirements_file):
         if not os.path.exists(requirements_file):
             logger.error("[red]Requirements file not found: {}[/]".format(requirements_file))
             return False
         
+        with open(requirements_file, 'rb') as f:
+            content = f.read()
+        # 以文件内容哈希作为安装缓存，需求文件变化后自动失效
+        file_hash = hashlib.sha256(content).hexdigest()
         if os.path.exists(requirements_file + ".coral_installed"):
-            return True
+            with open(requirements_file + ".coral_installed", 'r') as f:
+                if f.read().strip() == file_hash:
+                    return True
 
-        with open(requirements_file, 'r') as f:
-            lines = f.readlines()
+        lines = content.decode('utf-8-sig', errors='ignore').splitlines()
         
-        task = self.progress.add_task("[green]Checking plugin requirements...", total=len(lines))
+        # 一次性读取已安装包的元数据，避免逐个调用 pip show
+        installed = {normalize_name(d.metadata["Name"]) for d in distributions() if d.metadata["Name"]}
 
-        with self.progress:
-            for line in lines:
-                if line.startswith('#') or line.strip() == '':
-                    continue
-                
-                # 解析包名
-                package_name = re.split('>=|>|<=|<|==|!=', line.strip())[0].strip()
-                
-                try:
-                    subprocess.check_call([sys.executable, '-m', 'pip', 'show', package_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                except subprocess.CalledProcessError as e:
-                    logger.error("[red]Failed to check requirement: {}[/]".format(line.strip()))
-                    self.progress.stop()
-                    return False
-                self.progress.update(task, advance=1)
-        self.progress.stop()
+        for line in lines:
+            if line.startswith('#') or line.strip() == '':
+                continue
+            
+            if normalize_name(requirement_name(line)) not in installed:
+                logger.error("[red]Failed to check requirement: {}[/]".format(line.strip()))
+                return False
         
         with open(requirements_file + ".coral_installed", 'w') as f:
-            f.write("Installed")
+            f.write(file_hash)
 
         return True
\ No newline at end of file
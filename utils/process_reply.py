@@ -3,49 +3,46 @@ import json
 import re
 import random
 import logging
+import asyncio
+import functools
 
 logger = logging.getLogger(__name__)
 
+_URL_RE = re.compile(r"url=((?:https?|file)[^,]+)")
+_AT_RE = re.compile(r'\[CQ:at,qq=(\d+)(?:,name=\w+)?\]')
+
+_PROCESS_FUNCTIONS = (
+    ('process_text', 'process text'),
+    ('process_image', 'process image'),
+    ('process_video', 'process video'),
+    ('process_audio', 'process audio'),
+    ('search_memory', 'memory search'),
+    ('store_memory', 'memory store'),
+)
+
 class ProcessReply:
     register = None
     config = None
     def __init__(self, register, config):
         self.register = register
         self.config = config
+        self._pending_tasks = set()
         self.define_functions()
+        self.load_settings()
 
-    def define_functions(self):
-        if 'process_text' not in self.register.functions:
-            logger.warning('[yellow]process_text function is not registered, process text will not be working.[/]')
-            self.process_text = None
-        else:
-            self.process_text = "Callable"
-        if 'process_image' not in self.register.functions:
-            logger.warning('[yellow]process_image function is not registered, process image will not be working.[/]')
-            self.process_image = None
-        else:
-            self.process_image = "Callable"
-        if 'process_video' not in self.register.functions:
-            logger.warning('[yellow]process_voice function is not registered, process voice will not be working.[/]')
-            self.process_video = None
-        else:
-            self.process_video = "Callable"
-        if 'process_audio' not in self.register.functions:
-            logger.warning('[yellow]process_audio function is not registered, process audio will not be working.[/]')
-            self.process_audio = None
-        else:
-            self.process_audio = "Callable"
-        if 'search_memory' not in self.register.functions:
-            logger.warning('[yellow]search_memory function is not registered, memory search will not be working.[/]')
-            self.search_memory = None
-        else:
-            self.search_memory = "Callable"
-        if 'store_memory' not in self.register.functions:
-            logger.warning('[yellow]store_memory function is not registered, memory store will not be working.[/]')
-            self.store_memory = None
-        else:
-            self.store_memory = "Callable"
+    def load_settings(self):
+        self.at_reply = self.config.get('at_reply', False)
+        self.bot_qq_id = self.config.get('bot_qq_id')
+        self.reply_threshold = self.config.get('reply_rate', 100) * 0.01
+        self.settings_version = self.config.version
 
+    def define_functions(self):
+        for function_name, description in _PROCESS_FUNCTIONS:
+            if function_name not in self.register.functions:
+                logger.warning(f'[yellow]{function_name} function is not registered, {description} will not be working.[/]')
+                setattr(self, function_name, None)
+            else:
+                setattr(self, function_name, functools.partial(self.register.execute_function, function_name))
 
     async def process_message(self, message):
         """
@@ -54,36 +51,37 @@ class ProcessReply:
         raw_message = message['message']
         sender_user_id = message['sender_user_id']
         group_id = message['group_id']
+        if self.settings_version != self.config.version:
+            self.load_settings()
         
         is_at_message, at_matches, processed_message = self.process_at_message(raw_message)
         if is_at_message:
-            if self.config.get('bot_qq_id') not in at_matches:
-                logger.info(f'Received at message from {sender_user_id} in group {group_id}, but it is not for me.')
+            if self.bot_qq_id not in at_matches:
+                logger.info('Received at message from %s in group %s, but it is not for me.', sender_user_id, group_id)
                 return None
         else:
-            if self.config.get('at_reply', False):
-                logger.info(f'Received message from {sender_user_id} in group {group_id}, but it is not an at message.')
+            if self.at_reply:
+                logger.info('Received message from %s in group %s, but it is not an at message.', sender_user_id, group_id)
                 return None
             
         is_image, image_url = self.is_image_message(processed_message)
 
-        if not is_at_message and not self.config.get('at_reply', False) and not group_id == -1:
-            if random.randint(1, 100) >= self.config.get('reply_rate', 100):
-                logger.info(f'Received message from {sender_user_id} in group {group_id}, but it is not an at message and reply rate is too low.')
+        if not is_at_message and not self.at_reply and not group_id == -1:
+            if random.random() >= self.reply_threshold:
+                logger.info('Received message from %s in group %s, but it is not an at message and reply rate is too low.', sender_user_id, group_id)
                 return None
             
-        if self.search_memory is not None:
-            memory = self.register.execute_function('search_memory', {"sender_user_id": sender_user_id, "group_id": group_id})
-        else:
-            memory = None
-
         if is_image:
             if self.process_image:
-                send_message = await self.register.execute_function('process_image', {"image_url": image_url, "sender_user_id": sender_user_id, "group_id": group_id})
+                send_message = await self.process_image({"image_url": image_url, "sender_user_id": sender_user_id, "group_id": group_id})
             else:
                 return None
         elif self.process_text:
-            send_message = await self.register.execute_function('process_text', {"message": processed_message, "memory": memory, "sender_user_id": sender_user_id, "group_id": group_id})
+            # 仅文本处理需要记忆，图片消息不再查询
+            memory = None
+            if self.search_memory is not None:
+                memory = await self.search_memory({"sender_user_id": sender_user_id, "group_id": group_id})
+            send_message = await self.process_text({"message": processed_message, "memory": memory, "sender_user_id": sender_user_id, "group_id": group_id})
         else:
             logger.warning('[yellow]No process function is registered, message will not be processed.[/]')
             return None
@@ -98,7 +96,15 @@ class ProcessReply:
         sender_user_id = send_message['sender_user_id']
         group_id = send_message['group_id']
         if self.store_memory is not None:
-            await self.register.execute_function('store_memory', {"message": message,"reply": reply,"sender_user_id": sender_user_id, "group_id": group_id})
+            # 后台存储记忆，不阻塞回复发送
+            task = asyncio.create_task(self.store_memory({"message": message,"reply": reply,"sender_user_id": sender_user_id, "group_id": group_id}))
+            self._pending_tasks.add(task)
+            task.add_done_callback(self._finish_task)
+
+    def _finish_task(self, task):
+        self._pending_tasks.discard(task)
+        if not task.cancelled():
+            task.exception()  # 异常已由 Register 记录
 
     def is_image_message(self, message: str) -> tuple[bool, str]:
         """
@@ -110,13 +116,9 @@ class ProcessReply:
             - is_image (bool): 是否是图片消息。
             - image_url (str): 图片 URL。
         """
-        url_pattern = r"url=(https?[^,]+)"
-        image_match = re.search(url_pattern, message)
-        if image_match:
-            image_url = image_match.group(1)
-            return True, image_url
-        url_pattern = r"url=(file[^,]+)"
-        image_match = re.search(url_pattern, message)
+        if 'url=' not in message:
+            return False, ''
+        image_match = _URL_RE.search(message)
         if image_match:
             image_url = image_match.group(1)
             return True, image_url
@@ -134,10 +136,18 @@ class ProcessReply:
             - at_matches (list): 有匹配的 @ 提及集合。
             - processed_message (str): 处理后的消息字符串。
         """
-        at_pattern = re.compile(r'\[CQ:at,qq=(\d+)(?:,name=\w+)?\]')
-        at_matches = at_pattern.findall(message)
+        if '[CQ:at,' not in message:
+            return False, [], message
+        # 单次扫描同时收集 @ 对象并按匹配位置拼接剩余文本
+        at_matches = []
+        pieces = []
+        last_end = 0
+        for at_match in _AT_RE.finditer(message):
+            at_matches.append(at_match.group(1))
+            pieces.append(message[last_end:at_match.start()])
+            last_end = at_match.end()
         if at_matches:
-            processed_message = at_pattern.sub(lambda m: '', message)
-            return True, at_matches, processed_message
+            pieces.append(message[last_end:])
+            return True, at_matches, ''.join(pieces)
         else:
             return False,at_matches, message
\ No newline at end of file
@@ -5,32 +5,36 @@ import logging
 import asyncio
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.websockets import WebSocketState
 from starlette.websockets import WebSocketDisconnect
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+def _loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+_PRIVATE_MSG_PREFIX = '{"action":"send_private_msg","params":{"user_id":'
+_GROUP_MSG_PREFIX = '{"action":"send_group_msg","params":{"group_id":'
+
 def build_reply_json(reply_item, sender_user_id, group_id):
     if reply_item is None:
         return None
+    # 动作外层结构固定，只序列化会变化的字段
     if group_id == -1:
-        data = {
-            "action": "send_private_msg",
-            "params": {
-                "user_id": sender_user_id,
-                "message": reply_item
-            }
-        }
-        return json.dumps(data, ensure_ascii=False)
+        return _PRIVATE_MSG_PREFIX + _dumps(sender_user_id) + ',"message":' + _dumps(reply_item) + '}}'
     else:
-        data = {
-            "action": "send_group_msg",
-            "params": {
-                "group_id": group_id,
-                "message": reply_item
-            }
-        }
-        return json.dumps(data, ensure_ascii=False)
+        return _GROUP_MSG_PREFIX + _dumps(group_id) + ',"message":' + _dumps(reply_item) + '}}'
 
 class ReverseWS:
     websocket_port = 21050
@@ -43,51 +47,35 @@ class ReverseWS:
         self.register = register
         self.websocket_port = self.config.get("websocket_port", 21050)
         self.process_reply = process_reply
-        self.receive_data_task = None 
-        self.lock = asyncio.Lock()
+        # 按 (post_type, meta_event_type/message_type) 分发
+        self.data_handlers = {
+            ("meta_event", "lifecycle"): self.handle_lifecycle,
+            ("meta_event", "heartbeat"): self.handle_heartbeat,
+            ("message", "private"): self.handle_private_message,
+            ("message", "group"): self.handle_group_message,
+        }
+        self.WebsocketPort_instance = WebsocketPort(self, self.register)
 
         @self.app.websocket("/ws/api")
         async def websocket_endpoint(websocket: WebSocket):
             logger.info("WebSocket initializing")
-            self.WebsocketPort_instance = WebsocketPort(self, self.register, websocket)
+            connection = WebsocketConnection(websocket)
             await websocket.accept()
             logger.info("WebSocket connected")
-            self.WebsocketPort_instance.connected = True
-            if 'client_connected' in self.register.event_queues:
-                await self.register.execute_event('client_connected')
             try:
+                # 启动与注册也放在 try 内，client_connected 出错时同样会清理
+                connection.start_writer()
+                self.WebsocketPort_instance.attach(connection)
+                if 'client_connected' in self.register.event_queues:
+                    await self.register.execute_event('client_connected')
                 while True:
-                    if not websocket.application_state == WebSocketState.CONNECTED:
-                        raise WebSocketDisconnect()
-                    
-                    async with self.lock:
-                        if self.receive_data_task and not self.receive_data_task.done():
-                            await asyncio.sleep(1)
-                            continue
-
-                        self.receive_data_task = asyncio.create_task(websocket.receive_text())
-                    
-                    done, pending = await asyncio.wait(
-                        [self.receive_data_task]
-                    )
-                    if not self.receive_data_task.done():
-                        await asyncio.sleep(0.5)
-                        continue
-
-                    if self.receive_data_task in done:
-                        try:
-                            data = self.receive_data_task.result()
-                        except asyncio.CancelledError:
-                            print("Task was cancelled")
-                            await asyncio.sleep(0.5)
-                            continue
-                    else:
-                        self.receive_data_task.cancel()
-                        try:
-                            await self.receive_data_task  # 确保任务被取消
-                        except asyncio.CancelledError:
-                            pass
-                        continue
+                    # 直接取原始帧，文本帧与二进制帧均交由 _loads 解析
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+                    data = message.get("text")
+                    if data is None:
+                        data = message.get("bytes")
 
                     formatted_data = self.process_data(data)
                     if formatted_data is None:
@@ -96,14 +84,8 @@ class ReverseWS:
                     if 'prepare_reply' in self.register.event_queues:
                         prepared_result = await self.register.execute_event('prepare_reply', formatted_data)
                         if prepared_result['message'] is not None:
-                            logger.info(f"回复{prepared_result['message']}")
-                            if isinstance(prepared_result['message'], list):
-                                for item in prepared_result['message']:
-                                    reply_json = build_reply_json(item, prepared_result['sender_user_id'], prepared_result['group_id'])
-                                    await websocket.send_text(reply_json)
-                            else:
-                                reply_json = build_reply_json(prepared_result['message'], prepared_result['sender_user_id'], prepared_result['group_id'])
-                                await websocket.send_text(reply_json)
+                            logger.info("回复%s", prepared_result['message'])
+                            connection.enqueue_reply(prepared_result['message'], prepared_result['sender_user_id'], prepared_result['group_id'])
                             continue
                                             
                     result = await self.process_reply(formatted_data)
@@ -116,84 +98,171 @@ class ReverseWS:
                     sender_user_id = result['sender_user_id']
                     group_id = result['group_id']
 
-                    logger.info(f"回复{reply_item}")
+                    logger.info("回复%s", reply_item)
 
-                    if isinstance(reply_item, list):
-                        for item in reply_item:
-                            reply_json = build_reply_json(item, sender_user_id, group_id)
-                            await websocket.send_text(reply_json)
-                    else:
-                        reply_json = build_reply_json(reply_item, sender_user_id, group_id)
-                        await websocket.send_text(reply_json)
+                    # 回复走接收该消息的连接
+                    connection.enqueue_reply(reply_item, sender_user_id, group_id)
 
             except json.JSONDecodeError:
                 logger.error("[red]JSONDecodeError[/]")
             except WebSocketDisconnect:
                 logger.info("WebSocket disconnected")
-                self.WebsocketPort_instance.connected = False
+                self.WebsocketPort_instance.detach(connection)
                 if 'client_disconnected' in self.register.event_queues:
                     await self.register.execute_event('client_disconnected')
             except Exception as e:
                 logger.exception(f"[red]WebSocket error: {e}[/]")
                 raise e
+            finally:
+                # 只清理本次连接自己的发送协程
+                self.WebsocketPort_instance.detach(connection)
+                connection.stop_writer()
 
     def process_data(self, data):
         try:
-            data = json.loads(data)
-            if 'post_type' in data and data['post_type'] == 'meta_event':
-                if data['meta_event_type'] == 'lifecycle':
-                    if data['sub_type'] == 'connect':
-                        logger.info(f"已链接")
-                        return None
-                elif data['meta_event_type'] == 'heartbeat':
-                    return None
-            
-            if 'status' in data:
-                if data['status'] != 'ok':
-                    logger.error(f"发送/接收数据错误： {data['status']}")
+            data = _loads(data)
+            if not isinstance(data, dict):
+                logger.warning(f"未知数据类型： {data}")
                 return None
-            
-            elif 'post_type' in data and data['post_type'] == 'message':
-                sender_user_id = data.get('sender', {}).get('user_id')
-                raw_message = data['raw_message']
-                if data['message_type'] == 'private':
-                    group_id = -1
-                    logger.info(f"私聊消息： {raw_message} ，来自 {sender_user_id} ")
-                elif data['message_type'] == 'group':
-                    group_id = data.get('group_id')
-                    logger.info(f"群聊消息： {raw_message} ，来自 {sender_user_id} ，群号 {group_id} ")
-                else:
-                    logger.warning(f"未知消息类型： {data['message_type']}")
-                    return None
-                return {"message": raw_message,"sender_user_id": sender_user_id, "group_id": group_id}
-            
+            post_type = data.get('post_type')
+            if post_type is None:
+                # API 回执没有 post_type，直接交给状态处理
+                return self.handle_status(data)
+            if post_type == 'meta_event':
+                sub_type = data.get('meta_event_type')
             else:
-                logger.warning(f"未知数据类型： {data}")
+                sub_type = data.get('message_type')
+            handler = self.data_handlers.get((post_type, sub_type))
+            if handler is not None:
+                return handler(data)
+            if post_type == 'message':
+                logger.warning(f"未知消息类型： {sub_type}")
                 return None
+            logger.warning(f"未知数据类型： {data}")
+            return None
         except Exception as e:
             logger.exception(f"[red]数据处理错误: {e}[/]")
             raise e
 
+    def handle_lifecycle(self, data):
+        if data.get('sub_type') == 'connect':
+            logger.info(f"已链接")
+        return None
+
+    def handle_heartbeat(self, data):
+        return None
+
+    def handle_status(self, data):
+        if 'status' not in data:
+            logger.warning(f"未知数据类型： {data}")
+        elif data['status'] != 'ok':
+            logger.error(f"发送/接收数据错误： {data['status']}")
+        return None
+
+    def handle_private_message(self, data):
+        sender = data.get('sender')
+        sender_user_id = sender.get('user_id') if sender else None
+        raw_message = data['raw_message']
+        logger.info("私聊消息： %s ，来自 %s ", raw_message, sender_user_id)
+        return {"message": raw_message,"sender_user_id": sender_user_id, "group_id": -1}
+
+    def handle_group_message(self, data):
+        sender = data.get('sender')
+        sender_user_id = sender.get('user_id') if sender else None
+        raw_message = data['raw_message']
+        group_id = data.get('group_id')
+        logger.info("群聊消息： %s ，来自 %s ，群号 %s ", raw_message, sender_user_id, group_id)
+        return {"message": raw_message,"sender_user_id": sender_user_id, "group_id": group_id}
+
     def start(self):
         uvicorn.run(self.app, host="127.0.0.1", port=self.websocket_port)
 
 
 
+class WebsocketConnection:
+    """
+    单个 WebSocket 连接的发送队列与写协程。
+    """
+    websocket: WebSocket = None
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.loop = asyncio.get_running_loop()
+        self.send_queue = asyncio.Queue()
+        self.writer_task = None
+
+    def start_writer(self):
+        self.writer_task = self.loop.create_task(self.writer())
+
+    def stop_writer(self):
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+            self.writer_task = None
+
+    async def writer(self):
+        # 由单一写协程按顺序发送队列中的消息
+        while True:
+            reply_json = await self.send_queue.get()
+            try:
+                await self.websocket.send_text(reply_json)
+            except Exception as e:
+                logger.exception(f"[red]WebSocket send error: {e}[/]")
+
+    def enqueue_reply(self, reply_item, sender_user_id, group_id):
+        # OneBot 每帧只接受一个动作，列表回复需逐条发送
+        reply_items = reply_item if isinstance(reply_item, list) else [reply_item]
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        for item in reply_items:
+            reply_json = build_reply_json(item, sender_user_id, group_id)
+            if reply_json is None:
+                continue
+            if running_loop is self.loop:
+                self.send_queue.put_nowait(reply_json)
+            else:
+                # asyncio.Queue 非线程安全，其他线程或事件循环需交回连接所在循环入队
+                self.loop.call_soon_threadsafe(self.send_queue.put_nowait, reply_json)
+
+
 class WebsocketPort:
     ReverseWS_instance = None
     register = None
-    websocket: WebSocket = None
+    connection: WebsocketConnection = None
 
-    def __init__(self, ReverseWS_instance, register, websocket: WebSocket):
+    def __init__(self, ReverseWS_instance, register):
         self.ReverseWS_instance = ReverseWS_instance
         self.connected = False
         self.register = register
-        self.websocket = websocket
+        self.connections = []
+        self.connection = None
+        self._pending_tasks = set()
+        self.register_functions()
+
+    def register_functions(self):
         self.register.register_function('ws_send', self.ws_sender)
         self.register.register_command('send', "send message to websocket", self.command_sender)
-        
+
+    def attach(self, connection: WebsocketConnection):
+        # 主动发送使用最近建立的连接，注册仅在重载清空后补回
+        self.connections.append(connection)
+        self.connection = connection
+        self.connected = True
+        if 'ws_send' not in self.register.functions:
+            self.register_functions()
+
+    def detach(self, connection: WebsocketConnection):
+        if connection not in self.connections:
+            return
+        self.connections.remove(connection)
+        # 当前连接断开时回退到仍在线的最近连接
+        self.connection = self.connections[-1] if self.connections else None
+        self.connected = self.connection is not None
+
     async def ws_sender(self, result, **kwargs):
-        if not self.connected:
+        connection = self.connection
+        if connection is None:
             logger.warning("WebSocket未连接")
             return None
         try:
@@ -203,23 +272,15 @@ class WebsocketPort:
         except KeyError:
             logger.error("Invalid arguments.\n Usage: ws_send <{message:str|list, sender_user_id:int, group_id:int}>")
             return None
-        logger.info(f"发送{reply_item}")
-        if self.ReverseWS_instance.receive_data_task is not None and not self.ReverseWS_instance.receive_data_task.done():
-            logger.info("正在处理消息，取消当前任务")
-            self.ReverseWS_instance.receive_data_task.cancel()
-            self.ReverseWS_instance.lock = asyncio.Lock()
-        if isinstance(reply_item, list):
-            for item in reply_item:
-                reply_json = build_reply_json(item, sender_user_id, group_id)
-                await self.websocket.send_text(reply_json)
-        else:
-            reply_json = build_reply_json(reply_item, sender_user_id, group_id)
-            await self.websocket.send_text(reply_json)
-        logger.info("已发送")
+        logger.info("发送%s", reply_item)
+        connection.enqueue_reply(reply_item, sender_user_id, group_id)
+        logger.info("已加入发送队列")
 
 
     def command_sender(self, *args):
-        if not self.connected:
+        # 控制台线程中调用，连接可能随时被事件循环线程移除，只读取一次
+        connection = self.connection
+        if connection is None:
             return "WebSocket未连接"
         try:
             args_str = " ".join(args)
@@ -227,5 +288,21 @@ class WebsocketPort:
         except ValueError:
             return "Invalid arguments.\n Usage: ws_send <{message:str|list> <sender_user_id> <group_id>"
         processed_message = {"message": message, "sender_user_id": sender_user_id, "group_id": group_id}
-        asyncio.run(self.ws_sender(processed_message))
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        loop = connection.loop
+        if running_loop is loop:
+            # 在 WebSocket 所在事件循环内（如聊天指令）调用，直接调度
+            task = loop.create_task(self.ws_sender(processed_message))
+            self._pending_tasks.add(task)
+            task.add_done_callback(self._pending_tasks.discard)
+        else:
+            future = asyncio.run_coroutine_threadsafe(self.ws_sender(processed_message), loop)
+            try:
+                future.result(timeout=10)
+            except TimeoutError:
+                future.cancel()
+                return "发送超时"
         return "已发送"
\ No newline at end of file